@@ -1,5 +1,5 @@
 import os
-import requests
+import json
 import tempfile
 import time
 import asyncio
@@ -8,18 +8,15 @@ from urllib.parse import urlparse
 from pathlib import Path
 
 from fastapi import FastAPI, Depends, HTTPException, Security
+from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel
-from dotenv import load_dotenv
 from langchain_core.documents import Document
 import pytesseract
 pytesseract.pytesseract.tesseract_cmd = "/usr/bin/tesseract"
 
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_community.document_loaders import PyPDFLoader
-from langchain_community.vectorstores import FAISS
 from langchain_nvidia_ai_endpoints import NVIDIAEmbeddings, NVIDIARerank
-from langchain_pinecone import PineconeVectorStore
 from langchain.retrievers import ContextualCompressionRetriever
 
 try:
@@ -33,12 +30,23 @@ except ImportError:
     ADVANCED_LOADERS_AVAILABLE = False
 
 # Local modules - updated imports for new structure
+from core.config import (
+    AUTH_TOKEN, PINECONE_INDEX_NAME, NVIDIA_API_KEY, FAISS_CACHE_SIZE, EMBED_BATCH_SIZE, URL_REVALIDATE_SECS,
+)
 from core.logger import logger, log_request as logger_log_request
-from app.rag_logic import create_rag_chain, NVIDIA_LLM_MODEL, query_cache
+from app.rag_logic import (
+    create_rag_chain, NVIDIA_LLM_MODEL, query_cache, CachedRetriever,
+    AsyncMultiShardRetriever, InMemoryBackend, CachedQueryEmbeddings, prebuild_chains,
+)
 from core.db import setup_database, log_request
+from app.indexing import (
+    build_faiss, fetch_file, remote_validators, text_digest, load_and_split, map_concurrently,
+    embed_in_batches, get_pinecone_store,
+)
+from core.splitting import make_text_splitter
 
-load_dotenv()
 setup_database()
+prebuild_chains([NVIDIA_LLM_MODEL])
 
 # FastAPI init ---------------------------------------------------------------
 app = FastAPI(
@@ -52,13 +60,13 @@ app = FastAPI(
 )
 
 auth_scheme = HTTPBearer()
-AUTH_TOKEN = os.getenv("AUTH_TOKEN")
-PINECONE_INDEX_NAME = os.getenv("PINECONE_INDEX_NAME", "hackathon-pinecone-index")
-NVIDIA_API_KEY = os.getenv("NVIDIA_API_KEY", "")
 
 # Embeddings & caches --------------------------------------------------------
-embeddings = NVIDIAEmbeddings(model="nvidia/nv-embed-v1")
-FAISS_CACHE = {}
+embeddings = CachedQueryEmbeddings(NVIDIAEmbeddings(model="nvidia/nv-embed-v1", max_batch_size=EMBED_BATCH_SIZE))
+# content digest -> FAISS shard, so repeated documents skip embedding;
+# url -> content digest + HTTP validators, so repeated URLs also skip the download
+FAISS_CACHE = InMemoryBackend(maxsize=FAISS_CACHE_SIZE)
+URL_DIGESTS = InMemoryBackend(maxsize=FAISS_CACHE_SIZE * 4)
 
 # Performance monitor --------------------------------------------------------
 class PerformanceMonitor:
@@ -108,6 +116,10 @@ class Request(BaseModel):
 class Response(BaseModel):
     answers: List[str]
 
+class StreamRequest(BaseModel):
+    documents: Optional[Union[str, List[str]]] = None
+    question: str
+
 # Utility: multi-format loader ----------------------------------------------
 def get_document_loader(file_path: str, url: str):
     ext = url.lower().split('.')[-1].split('?')[0]
@@ -122,60 +134,138 @@ def get_document_loader(file_path: str, url: str):
         if ext in ['xlsx', 'xls'] and ADVANCED_LOADERS_AVAILABLE:
             return UnstructuredExcelLoader(file_path)
         if ext in ['png', 'jpg', 'jpeg', 'gif', 'bmp'] and ADVANCED_LOADERS_AVAILABLE:
-            return UnstructuredImageLoader(file_path, mode="elements")
+            # OCR only: skips unstructured's layout-detection model
+            return UnstructuredImageLoader(file_path, mode="elements", strategy="ocr_only")
         logger.warning(f"Unsupported format .{ext}")
         return PyPDFLoader(file_path)
     except Exception as e:
         logger.error(f"Loader error for .{ext}: {e}")
         return PyPDFLoader(file_path)
 
+# Per-document FAISS shards -----------------------------------------------
+text_splitter = make_text_splitter(chunk_size=1000, chunk_overlap=250)
+
+def cached_shard(u: str):
+    """Shard already built for URL `u`, or None if unknown or changed upstream.
+
+    Entries younger than URL_REVALIDATE_SECS are reused as-is; older ones are
+    reused only if a HEAD request returns the same ETag/Last-Modified.
+    """
+    entry = URL_DIGESTS.get(u)
+    if entry is None:
+        return None
+    shard = FAISS_CACHE.get(entry["digest"])
+    if shard is None:
+        return None
+    if time.monotonic() - entry["checked"] < URL_REVALIDATE_SECS:
+        return shard
+    if entry["validators"] and remote_validators(u) == entry["validators"]:
+        entry["checked"] = time.monotonic()
+        return shard
+    return None
+
+def load_document(u: str, tmp: str):
+    """Download/load and chunk one URL.
+
+    Returns (digest, shard, chunks, validators): `shard` is set when a document
+    with the same BLAKE2b-64 content digest is already indexed (e.g. the same file
+    served from a mirror URL), otherwise `chunks` still need embedding.
+    (None, None, [], None) on failure.
+    """
+    validators = None
+    try:
+        file_ext = Path(urlparse(u).path).suffix.lower()
+
+        if file_ext in ['.pdf', '.docx', '.doc', '.pptx', '.ppt', '.xlsx', '.xls', '.png', '.jpg', '.jpeg', '.gif', '.bmp', '.txt']:
+            logger.info(f"Downloading file with extension '{file_ext}' from {u[:60]}…")
+            # Each URL gets its own directory so same-named files can download in parallel
+            filename = Path(urlparse(u).path).name
+            fp, validators, digest = fetch_file(u, os.path.join(tempfile.mkdtemp(dir=tmp), filename))
+
+            shard = FAISS_CACHE.get(digest)
+            if shard is not None:
+                return digest, shard, [], validators
+
+            loader = get_document_loader(fp, u)
+            chunks = load_and_split(loader, text_splitter) if loader else []
+
+        else:
+            logger.info(f"No file extension found. Loading as webpage: {u[:60]}…")
+            loader = WebBaseLoader(u)
+            docs = loader.load()
+            digest = text_digest(d.page_content for d in docs)
+
+            shard = FAISS_CACHE.get(digest)
+            if shard is not None:
+                return digest, shard, [], validators
+            chunks = text_splitter.split_documents(docs)
+
+    except Exception as e:
+        logger.error(f"Failed to process URL {u[:70]}: {e}")
+        return None, None, [], None
+
+    return digest, None, chunks, validators
+
+def build_shards(urls: List[str], tmp: str):
+    """Return one FAISS shard (or None) per URL, in order.
+
+    Documents are loaded concurrently first; the chunks of every new document are
+    then embedded together in full-size batches, and the vectors are sliced back
+    into one shard per content digest.
+    """
+    loaded = map_concurrently(lambda u: load_document(u, tmp), urls)
+
+    pending = {}
+    for digest, shard, chunks, _ in loaded:
+        if shard is None and chunks:
+            pending.setdefault(digest, chunks)
+    texts = [c.page_content for chunks in pending.values() for c in chunks]
+    vectors = embed_in_batches(texts, embeddings)
+
+    built, offset = {}, 0
+    for digest, chunks in pending.items():
+        built[digest] = build_faiss(chunks, embeddings, vectors=vectors[offset:offset + len(chunks)])
+        offset += len(chunks)
+        FAISS_CACHE.set(digest, built[digest])
+
+    shards = []
+    for u, (digest, shard, _, validators) in zip(urls, loaded):
+        if shard is None:
+            shard = built.get(digest)
+        if shard is not None:
+            URL_DIGESTS.set(u, {"digest": digest, "validators": validators, "checked": time.monotonic()})
+        shards.append(shard)
+    return shards
+
 # Retriever -----------------------------------------------------------------
 def get_retriever(request_docs: Optional[Union[str, List[str]]], complexity: str):
 
     if not request_docs:
-        vec_store = PineconeVectorStore.from_existing_index(PINECONE_INDEX_NAME, embeddings)
+        vec_store = get_pinecone_store(embeddings)
         k = {"simple": 6, "medium": 8, "complex": 10}.get(complexity, 8)
-        return vec_store.as_retriever(search_kwargs={"k": k})
+        return CachedRetriever(
+            retriever=vec_store.as_retriever(search_kwargs={"k": k}),
+            scope=f"{PINECONE_INDEX_NAME}:{k}",
+        )
 
     urls = request_docs if isinstance(request_docs, list) else [request_docs]
 
-    all_docs = []
+    shards = dict(zip(urls, map_concurrently(cached_shard, urls)))
+    missing = [u for u, shard in shards.items() if shard is None]
     with tempfile.TemporaryDirectory() as tmp:
-        for u in urls:
-            try:
-                file_ext = Path(urlparse(u).path).suffix.lower()
-
-                if file_ext in ['.pdf', '.docx', '.doc', '.pptx', '.ppt', '.xlsx', '.xls', '.png', '.jpg', '.jpeg', '.gif', '.bmp', '.txt']:
-                    logger.info(f"Downloading file with extension '{file_ext}' from {u[:60]}…")
-                    r = requests.get(u, timeout=30)
-                    r.raise_for_status()
-                        
-                    filename = Path(urlparse(u).path).name
-                    fp = os.path.join(tmp, filename)
-                    with open(fp, 'wb') as f:
-                        f.write(r.content)
-                        
-                    loader = get_document_loader(fp, u)
-                    if loader:
-                        all_docs.extend(loader.load())
-
-                else:
-                    logger.info(f"No file extension found. Loading as webpage: {u[:60]}…")
-                    loader = WebBaseLoader(u)
-                    all_docs.extend(loader.load())
-
-            except Exception as e:
-                logger.error(f"Failed to process URL {u[:70]}: {e}")
-
-        if not all_docs:
-            raise HTTPException(status_code=500, detail="Could not load or extract text from any of the provided documents.")
-        
-        ts = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=250)
-        chunks = ts.split_documents(all_docs)
-        vec_store = FAISS.from_documents(chunks, embeddings)
-    
+        built = build_shards(missing, tmp)
+    shards.update(zip(missing, built))
+    failed = [u for u, shard in shards.items() if shard is None]
+    if failed:
+        logger.warning(f"⚠️ {len(failed)}/{len(urls)} documents could not be indexed: {failed}")
+    # Mirror URLs resolve to the same shard; search it once
+    shards = list({id(shard): shard for shard in shards.values() if shard is not None}.values())
+
+    if not shards:
+        raise HTTPException(status_code=500, detail="Could not load or extract text from any of the provided documents.")
+
     k = {"simple": 6, "medium": 8, "complex": 10}.get(complexity, 8)
-    ret = vec_store.as_retriever(search_kwargs={"k": k})
+    ret = AsyncMultiShardRetriever(shards=shards, embeddings=embeddings, k=k)
 
     if complexity == 'complex':
         comp = NVIDIARerank(model="nvidia/llama-3.2-nv-rerankqa-1b-v2", api_key=NVIDIA_API_KEY)
@@ -232,22 +322,45 @@ def classify_question_complexity(question):
 async def process_claims(req: Request, api_key: str = Depends(verify_api_key)):
     perf_mon.increment_requests()
     dominant = 'medium'
-    retriever = get_retriever(req.documents, dominant)
-    rag = create_rag_chain(retriever)
-    sem = asyncio.Semaphore(3)
-
-    async def _answer(q):
-        async with sem:
-            start = time.time()
-            res = await rag.ainvoke({"input": q})
-            dur = time.time() - start
-            perf_mon.add_response_time(dur)
-            log_request(req.documents, q, res.get("answer", "error"), dur, NVIDIA_LLM_MODEL)
-            return res.get("answer", "error")
-
-    answers = await asyncio.gather(*[_answer(q) for q in req.questions])
+    # Download/parse/embed is blocking work; keep it off the event loop
+    retriever = await asyncio.to_thread(get_retriever, req.documents, dominant)
+    # First call pre-warms the caches (Redis writes, query embeddings)
+    rag = await asyncio.to_thread(create_rag_chain, retriever, embeddings=embeddings, documents=req.documents)
+
+    results = await rag.batch_ainvoke([{"input": q} for q in req.questions])
+
+    answers = [res.get("answer", "error") for res in results]
+    durations = [res.get("time_taken", 0.0) for res in results]
+    for dur in durations:
+        perf_mon.add_response_time(dur)
+    await asyncio.to_thread(_log_answers, req.documents, req.questions, answers, durations)
     return Response(answers=answers)
 
+def _log_answers(documents, questions, answers, durations):
+    for q, answer, dur in zip(questions, answers, durations):
+        log_request(documents, q, answer, dur, NVIDIA_LLM_MODEL)
+
+@app.post("/api/v1/stream")
+async def stream_answer(req: StreamRequest, api_key: str = Depends(verify_api_key)):
+    """Answer one question as Server-Sent Events: one `data:` event per token
+    chunk (JSON-encoded string), then a final `done` event."""
+    perf_mon.increment_requests()
+    retriever = await asyncio.to_thread(get_retriever, req.documents, 'medium')
+    rag = await asyncio.to_thread(create_rag_chain, retriever, embeddings=embeddings, documents=req.documents)
+
+    async def events():
+        start = time.time()
+        result = {}
+        async for token in rag.astream({"input": req.question}, result):
+            yield f"data: {json.dumps(token)}\n\n"
+        answer = result.get("answer", "")
+        yield f"event: done\ndata: {json.dumps({'answer': answer})}\n\n"
+        dur = time.time() - start
+        perf_mon.add_response_time(dur)
+        await asyncio.to_thread(_log_answers, req.documents, [req.question], [answer], [dur])
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
 # Health --------------------------------------------------------------------
 @app.get("/health")
 def health():
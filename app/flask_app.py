@@ -1,40 +1,42 @@
 import os
 import time
 import hashlib
-import requests
 from pathlib import Path
 from urllib.parse import urlparse
 from flask import Flask, request, render_template, flash, session
 from werkzeug.utils import secure_filename
-from dotenv import load_dotenv
 
 # LangChain loaders/vectorstores
 from langchain_community.document_loaders import (
     PyPDFLoader, Docx2txtLoader, TextLoader,
     UnstructuredPowerPointLoader, UnstructuredExcelLoader, WebBaseLoader
 )
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import FAISS
-from langchain_pinecone import PineconeVectorStore
 from langchain_nvidia_ai_endpoints import NVIDIAEmbeddings
 
 # Local utilities - updated imports for new structure
+from core.config import PINECONE_INDEX_NAME, FLASK_SECRET, EMBED_BATCH_SIZE, RAG_TOP_K
 from core.logger import logger
 from core.db import setup_database, log_request
 from app import rag_logic
+from app.indexing import (
+    build_faiss, download_file, load_and_split, map_concurrently, SESSION, get_pinecone_store,
+)
+from core.splitting import make_text_splitter
 
 # ----------------- Config -----------------
-load_dotenv()
 setup_database()
+# Build the LLM chain for every selectable model at the default temperature
+rag_logic.prebuild_chains(rag_logic.MODEL_CHOICES)
 
 UPLOAD_FOLDER = "uploads"
 ALLOWED_EXTENSIONS = {"pdf", "docx", "doc", "pptx", "ppt", "xlsx", "xls", "txt"}
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
-embeddings = NVIDIAEmbeddings(model="nvidia/nv-embed-v1")
-PINECONE_INDEX_NAME = os.getenv("PINECONE_INDEX_NAME", "")
+embeddings = rag_logic.CachedQueryEmbeddings(
+    NVIDIAEmbeddings(model="nvidia/nv-embed-v1", max_batch_size=EMBED_BATCH_SIZE)
+)
 app = Flask(__name__, template_folder="../templates", static_folder="../static")
-app.secret_key = os.getenv("FLASK_SECRET", "devsecret")
+app.secret_key = FLASK_SECRET
 app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
 app.config["MAX_CONTENT_LENGTH"] = 80 * 1024 * 1024  # 80MB
 
@@ -54,90 +56,92 @@ def get_document_loader(file_path):
         return UnstructuredExcelLoader(file_path)
     return TextLoader(file_path, encoding="utf-8")
 
+text_splitter = make_text_splitter(chunk_size=1000, chunk_overlap=250)
+
+def upload_digest(path):
+    """Content digest of an uploaded file; scopes cached answers to these bytes."""
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def load_file(fp):
+    """Parse and chunk one uploaded file in the parse worker pool."""
+    try:
+        loader = get_document_loader(fp)
+        logger.info(f"Loaded {loader} for {fp}")
+        return load_and_split(loader, text_splitter)
+    except Exception as e:
+        logger.error(f"❌ Error loading {fp}: {e}")
+        return []
+
 def build_faiss_for_files(file_paths):
-    """Build a fresh FAISS index from uploaded files (no caching)."""
-    all_docs = []
-    for fp in file_paths:
-        try:
-            loader = get_document_loader(fp)
-            logger.info(f"Loaded {loader} for {fp}")
-            all_docs.extend(loader.load())
-        except Exception as e:
-            logger.error(f"❌ Error loading {fp}: {e}")
+    """Build a fresh FAISS index from uploaded files (no caching).
 
-    if not all_docs:
+    Files are parsed in parallel across the worker processes instead of one
+    after another on the request thread.
+    """
+    chunks = [chunk for file_chunks in map_concurrently(load_file, file_paths) for chunk in file_chunks]
+
+    if not chunks:
         return None
 
-    ts = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=250)
-    chunks = ts.split_documents(all_docs)
-    vec_store = FAISS.from_documents(chunks, embeddings)
+    vec_store = build_faiss(chunks, embeddings)
     logger.info(f"✅ Built FAISS index with {len(chunks)} chunks from files")
     return vec_store
 
-def build_faiss_for_urls(urls):
-    """Download real files or load webpages, then build FAISS index."""
-    all_docs = []
-
-    for link in urls:
+def load_link(link):
+    """Download a real file or load a webpage; returns its documents."""
+    try:
+        # HEAD check (ignore errors)
         try:
-            # HEAD check (ignore errors)
-            try:
-                head = requests.head(link, allow_redirects=True, timeout=10)
-                ctype = (head.headers.get("Content-Type") or "").lower()
-            except Exception:
-                ctype = ""
-            ext = Path(urlparse(link).path).suffix.lower()
-
-            if ext in [".pdf", ".docx", ".doc", ".pptx", ".ppt", ".xlsx", ".xls", ".txt"] or \
-               any(x in ctype for x in ["pdf", "word", "officedocument", "text", "excel", "presentation"]):
-                # Download and parse file
-                r = requests.get(link, timeout=30)
-                if r.status_code == 200 and r.content:
-                    filename = os.path.basename(urlparse(link).path) or f"file_{hashlib.md5(link.encode()).hexdigest()}.dat"
-                    save_path = os.path.join(UPLOAD_FOLDER, filename)
-                    with open(save_path, "wb") as f:
-                        f.write(r.content)
-                    loader = get_document_loader(save_path)
-                    all_docs.extend(loader.load())
-                    logger.info(f"📄 Downloaded and loaded {filename} from {link}")
-            else:
-                # Treat as webpage
-                logger.info(f"🌐 Loading webpage content from {link}")
-                loader = WebBaseLoader(link)
-                all_docs.extend(loader.load())
-
-        except Exception as e:
-            logger.error(f"❌ Error processing {link}: {e}")
+            head = SESSION.head(link, allow_redirects=True, timeout=10)
+            ctype = (head.headers.get("Content-Type") or "").lower()
+        except Exception:
+            ctype = ""
+        ext = Path(urlparse(link).path).suffix.lower()
+
+        if ext in [".pdf", ".docx", ".doc", ".pptx", ".ppt", ".xlsx", ".xls", ".txt"] or \
+           any(x in ctype for x in ["pdf", "word", "officedocument", "text", "excel", "presentation"]):
+            # Download and parse file
+            # Links download in parallel, so the URL digest keeps same-named files
+            # from different links from overwriting each other
+            link_id = hashlib.blake2b(link.encode(), digest_size=16).hexdigest()
+            filename = os.path.basename(urlparse(link).path) or "file.dat"
+            save_path = download_file(link, os.path.join(UPLOAD_FOLDER, f"{link_id}_{filename}"))
+            docs = get_document_loader(save_path).load()
+            logger.info(f"📄 Downloaded and loaded {filename} from {link}")
+            return docs
+
+        # Treat as webpage
+        logger.info(f"🌐 Loading webpage content from {link}")
+        return WebBaseLoader(link).load()
+
+    except Exception as e:
+        logger.error(f"❌ Error processing {link}: {e}")
+        return []
+
+def build_faiss_for_urls(urls):
+    """Download real files or load webpages concurrently, then build FAISS index."""
+    all_docs = [doc for docs in map_concurrently(load_link, urls) for doc in docs]
 
     if not all_docs:
         logger.warning("⚠️ No valid text extracted from provided URLs")
         return None
 
-    ts = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=250)
-    chunks = ts.split_documents(all_docs)
-    vec_store = FAISS.from_documents(chunks, embeddings)
+    chunks = text_splitter.split_documents(all_docs)
+    vec_store = build_faiss(chunks, embeddings)
     logger.info(f"✅ Built FAISS index with {len(chunks)} chunks from URLs")
     return vec_store
 
 # ----------------- Routes -----------------
 @app.route("/", methods=["GET", "POST"])
 def index():
-    model_choices = [
-        "qwen/qwen2.5-7b-instruct",
-        "mistralai/mistral-small-3.1-24b-instruct-2503",
-        "meta/llama-4-maverick-17b-128e-instruct",
-        "meta/llama-4-scout-17b-16e-instruct",
-        "nvidia/llama-3.3-nemotron-super-49b-v1",
-        "mistralai/mistral-small-24b-instruct",
-        "qwen/qwen2.5-coder-32b-instruct",
-        "meta/llama-3.3-70b-instruct",
-        "nvidia/llama-3.1-nemotron-70b-instruct",
-        "google/gemma-3n-e4b-it",
-        "google/gemma-3n-e2b-it",
-    ]
+    model_choices = rag_logic.MODEL_CHOICES
     answer, sources, query_text = None, [], ""
     selected_model = session.get("selected_model", model_choices[0])
-    selected_temp = float(session.get("selected_temp", 0.5))
+    selected_temp = float(session.get("selected_temp", 0.0))
 
     if request.method == "POST":
         selected_model = request.form.get("model") or selected_model
@@ -145,7 +149,7 @@ def index():
         try:
             selected_temp = float(request.form.get("temperature", selected_temp))
         except ValueError:
-            selected_temp = 0.5
+            selected_temp = 0.0
         session["selected_temp"] = selected_temp
 
         query_text = request.form.get("question", "").strip()
@@ -153,6 +157,7 @@ def index():
         document_links = [link.strip() for link in request.form.get("document_links", "").strip().splitlines() if link.strip()]
 
         retriever = None
+        documents = None
 
         if uploaded_files and any(f.filename for f in uploaded_files if allowed_file(f.filename)):
             saved_paths = []
@@ -164,20 +169,25 @@ def index():
                     saved_paths.append(save_path)
                     logger.info(f"📁 Uploaded {filename}")
             if saved_paths:
+                documents = [upload_digest(path) for path in saved_paths]
                 vec_store = build_faiss_for_files(saved_paths)
                 if vec_store:
-                    retriever = vec_store.as_retriever(search_kwargs={"k": 5})
+                    retriever = vec_store.as_retriever(search_kwargs={"k": RAG_TOP_K})
 
         elif document_links:
+            documents = document_links
             vec_store = build_faiss_for_urls(document_links)
             if vec_store:
-                retriever = vec_store.as_retriever(search_kwargs={"k": 5})
+                retriever = vec_store.as_retriever(search_kwargs={"k": RAG_TOP_K})
 
         else:
             try:
                 logger.info("📦 Using Pinecone fallback")
-                pinecone_store = PineconeVectorStore.from_existing_index(PINECONE_INDEX_NAME, embeddings)
-                retriever = pinecone_store.as_retriever(search_kwargs={"k": 5})
+                pinecone_store = get_pinecone_store(embeddings)
+                retriever = rag_logic.CachedRetriever(
+                    retriever=pinecone_store.as_retriever(search_kwargs={"k": RAG_TOP_K}),
+                    scope=f"{PINECONE_INDEX_NAME}:{RAG_TOP_K}",
+                )
             except Exception as e:
                 logger.error(f"❌ Pinecone error: {e}")
                 flash("Pinecone retriever not available", "danger")
@@ -188,7 +198,9 @@ def index():
             rag_chain = rag_logic.create_rag_chain(
                 retriever=retriever,
                 model_name=selected_model,
-                temperature=selected_temp
+                temperature=selected_temp,
+                embeddings=embeddings,
+                documents=documents,
             )
             start = time.time()
             res = rag_chain.invoke({"input": query_text})
@@ -0,0 +1,299 @@
+# Indexing helpers shared by the Flask UI and the FastAPI service
+
+import functools
+import hashlib
+import logging
+import math
+import multiprocessing
+import os
+import tempfile
+import pickle
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import faiss
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_pinecone import PineconeVectorStore
+
+from core.embed_cache import get_embedding_cache, model_name
+from core.config import (
+    EMBED_BATCH_SIZE, EMBED_CONCURRENCY, DOWNLOAD_WORKERS, PARSE_WORKERS, FAISS_IVF_MIN_VECTORS, FAISS_NPROBE,
+    FAISS_USE_GPU, FAISS_INDEX_FACTORY, PINECONE_INDEX_NAME,
+)
+
+
+def _make_session():
+    """One pooled keep-alive session for every document download.
+
+    Transient gateway errors and dropped connections are retried with backoff
+    on the same pooled connections instead of failing the document.
+    """
+    session = requests.Session()
+    retries = Retry(total=3, backoff_factor=0.5, status_forcelist=[502, 503, 504])
+    adapter = HTTPAdapter(pool_connections=DOWNLOAD_WORKERS, pool_maxsize=DOWNLOAD_WORKERS * 2, max_retries=retries)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+SESSION = _make_session()
+
+
+# (connect, read) seconds: fail fast on unreachable hosts, allow slow large bodies
+DOWNLOAD_TIMEOUT = (5, 60)
+
+
+def download_file(url, dest_path, timeout=DOWNLOAD_TIMEOUT):
+    """Stream `url` to `dest_path`, which only appears once the body is complete.
+
+    The body is copied straight from the socket in 1 MiB pieces, so it is never
+    held in memory as a whole.
+    """
+    return fetch_file(url, dest_path, timeout)[0]
+
+
+def http_validators(headers):
+    """(ETag, Last-Modified) of a response, or None when the server sends neither."""
+    validators = (headers.get("ETag"), headers.get("Last-Modified"))
+    return validators if any(validators) else None
+
+
+def remote_validators(url, timeout=(5, 10)):
+    """Current validators of `url` from a HEAD request (None if unavailable)."""
+    try:
+        r = SESSION.head(url, allow_redirects=True, timeout=timeout)
+        r.raise_for_status()
+    except requests.RequestException:
+        return None
+    return http_validators(r.headers)
+
+
+def fetch_file(url, dest_path, timeout=DOWNLOAD_TIMEOUT):
+    """download_file that returns (dest_path, http_validators, content digest).
+
+    The validators let a later HEAD tell whether the file changed without
+    downloading it again. The BLAKE2b-64 digest of the bytes is computed from the
+    blocks as they are written, so the file is never read back just to hash it.
+    """
+    h = hashlib.blake2b(digest_size=8)
+    with SESSION.get(url, stream=True, timeout=timeout) as r:
+        r.raise_for_status()
+        r.raw.decode_content = True
+        fd, part_path = tempfile.mkstemp(dir=os.path.dirname(dest_path) or ".", suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for block in iter(lambda: r.raw.read(1 << 20), b""):
+                    h.update(block)
+                    f.write(block)
+            os.replace(part_path, dest_path)
+        except BaseException:
+            os.unlink(part_path)
+            raise
+        return dest_path, http_validators(r.headers), h.hexdigest()
+
+
+def text_digest(texts):
+    """BLAKE2b-64 hex digest of a sequence of strings (e.g. loaded page contents)."""
+    h = hashlib.blake2b(digest_size=8)
+    for text in texts:
+        h.update(text.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def map_concurrently(fn, items, max_workers=DOWNLOAD_WORKERS):
+    """Run `fn` over I/O-bound items in a thread pool, preserving order."""
+    items = list(items)
+    if len(items) <= 1:
+        return [fn(item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as ex:
+        return list(ex.map(fn, items))
+
+
+_parse_pool = None
+_parse_pool_lock = threading.Lock()
+
+
+def _get_parse_pool():
+    # Spawned, not forked: the server process runs logging, DB-writer and chain
+    # prebuild threads, and forking it mid-request can copy their held locks
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is None:
+            _parse_pool = ProcessPoolExecutor(
+                max_workers=PARSE_WORKERS, mp_context=multiprocessing.get_context("spawn")
+            )
+        return _parse_pool
+
+
+def _load_and_split(loader, splitter):
+    return splitter.split_documents(loader.load())
+
+
+def load_and_split(loader, splitter):
+    """Parse and chunk a document in the worker process pool.
+
+    Parsing (pypdf, unstructured) is CPU-bound, so running it in processes lets
+    several documents parse in parallel while other threads download or embed.
+    Falls back to the calling thread when PARSE_WORKERS=0 or the pool is unusable.
+    """
+    if PARSE_WORKERS > 0 and _picklable(loader, splitter):
+        try:
+            return _get_parse_pool().submit(_load_and_split, loader, splitter).result()
+        except BrokenProcessPool:
+            pass
+    return _load_and_split(loader, splitter)
+
+
+def _picklable(*objs):
+    """Whether objs can be sent to a worker process. Checked before submitting,
+    so exceptions raised by the parser itself are never mistaken for this."""
+    try:
+        pickle.dumps(objs)
+    except (pickle.PicklingError, TypeError, AttributeError):
+        return False
+    return True
+
+
+# Documents are ingested on many threads at once; cap the embedding requests
+# they have in flight so bursts stay under the API rate limit
+_embed_slots = threading.BoundedSemaphore(max(EMBED_CONCURRENCY, 1))
+
+
+def _embed_batch(texts, embeddings):
+    with _embed_slots:
+        return embeddings.embed_documents(texts)
+
+
+def _embed_uncached(texts, embeddings, batch_size):
+    batches = [texts[start:start + batch_size] for start in range(0, len(texts), batch_size)]
+    results = map_concurrently(lambda batch: _embed_batch(batch, embeddings), batches, EMBED_CONCURRENCY)
+    return [vec for vectors in results for vec in vectors]
+
+
+def embed_in_batches(texts, embeddings, batch_size=EMBED_BATCH_SIZE):
+    """Embed texts with one request per batch of `batch_size` chunks, sending
+    up to EMBED_CONCURRENCY batches at once. Vectors come back in input order.
+
+    Chunks already in the on-disk embedding cache are not sent at all.
+    """
+    cache = get_embedding_cache()
+    if cache is None:
+        return _embed_uncached(texts, embeddings, batch_size)
+    return cache.embed_documents(
+        texts, lambda missing: _embed_uncached(missing, embeddings, batch_size), model_name(embeddings)
+    )
+
+
+def _build_quantized_faiss(chunks, vectors, embeddings):
+    """IVF index with 8-bit scalar quantization: ~4x smaller than flat float32
+    and sub-linear search. Only used once there is enough data to train it.
+
+    FAISS_INDEX_FACTORY swaps in any faiss.index_factory layout instead, e.g.
+    OPQ + IVF + PQ for much higher compression at some recall cost.
+    """
+    xb = np.asarray(vectors, dtype=np.float32)
+    n, dim = xb.shape
+    if FAISS_INDEX_FACTORY:
+        index = faiss.index_factory(dim, FAISS_INDEX_FACTORY, faiss.METRIC_L2)
+    else:
+        nlist = min(16384, 4 * int(math.sqrt(n)))
+        quantizer = faiss.IndexFlatL2(dim)
+        index = faiss.IndexIVFScalarQuantizer(quantizer, dim, nlist, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_L2)
+    index.train(xb)
+    index.add(xb)
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = min(FAISS_NPROBE, ivf.nlist)
+
+    ids = [str(uuid.uuid4()) for _ in chunks]
+    docstore = InMemoryDocstore(dict(zip(ids, chunks)))
+    return FAISS(embeddings, index, docstore, dict(enumerate(ids)))
+
+
+_gpu_resources = None
+_gpu_failed = False
+# FAISS GPU indexes and StandardGpuResources are not thread-safe, even for
+# search, and every shard shares the one resources object
+_gpu_lock = threading.Lock()
+
+
+class _SerializedGpuIndex:
+    """Proxy for a GPU index that makes every method call hold _gpu_lock, so
+    shards can still be searched from many retriever threads."""
+
+    def __init__(self, index):
+        self._index = index
+
+    def __getattr__(self, name):
+        attr = getattr(self._index, name)
+        if not callable(attr):
+            return attr
+
+        def locked(*args, **kwargs):
+            with _gpu_lock:
+                return attr(*args, **kwargs)
+        return locked
+
+
+def _gpu_available():
+    return (
+        FAISS_USE_GPU and not _gpu_failed
+        and hasattr(faiss, "StandardGpuResources") and faiss.get_num_gpus() > 0
+    )
+
+
+def _to_gpu(store):
+    """Move the store's index to GPU 0 when enabled and a device is available.
+
+    If the move fails (no usable device, unsupported index layout) the CPU index
+    is kept and GPU use is switched off for the rest of the process.
+    """
+    global _gpu_resources, _gpu_failed
+    if not _gpu_available():
+        return store
+    try:
+        with _gpu_lock:
+            if _gpu_resources is None:
+                _gpu_resources = faiss.StandardGpuResources()
+            gpu_index = faiss.index_cpu_to_gpu(_gpu_resources, 0, store.index)
+    except Exception as e:
+        _gpu_failed = True
+        logging.getLogger("DocRAG").warning("⚠️ FAISS GPU unavailable, keeping indexes on CPU: %s", e)
+        return store
+    store.index = _SerializedGpuIndex(gpu_index)
+    return store
+
+
+def build_faiss(chunks, embeddings, vectors=None):
+    """Build a FAISS store from chunks, embedding them in explicit batches
+    unless their `vectors` were already computed.
+
+    Small stores stay exact (IndexFlatL2); from FAISS_IVF_MIN_VECTORS chunks
+    upward the index is IVF + int8 scalar quantization. Either is searched on
+    the GPU when one is available.
+    """
+    texts = [c.page_content for c in chunks]
+    if vectors is None:
+        vectors = embed_in_batches(texts, embeddings)
+    if len(vectors) >= FAISS_IVF_MIN_VECTORS:
+        return _to_gpu(_build_quantized_faiss(chunks, vectors, embeddings))
+    return _to_gpu(FAISS.from_embeddings(
+        list(zip(texts, vectors)),
+        embeddings,
+        metadatas=[c.metadata for c in chunks],
+    ))
+
+
+@functools.lru_cache(maxsize=4)
+def get_pinecone_store(embeddings):
+    """Connect to the Pinecone index once per embeddings object and reuse the
+    client for every request."""
+    return PineconeVectorStore.from_existing_index(PINECONE_INDEX_NAME, embeddings)
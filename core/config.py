@@ -0,0 +1,83 @@
+# DocRAG configuration - loads .env once and exposes typed settings
+
+import os
+import functools
+from dotenv import load_dotenv
+
+
+@functools.lru_cache(maxsize=None)
+def load_env():
+    """Load .env into the process environment; repeated calls are no-ops."""
+    load_dotenv()
+    return True
+
+
+load_env()
+
+# --- Credentials ---
+NVIDIA_API_KEY = os.getenv("NVIDIA_API_KEY", "")
+AUTH_TOKEN = os.getenv("AUTH_TOKEN")
+FLASK_SECRET = os.getenv("FLASK_SECRET", "devsecret")
+
+# --- Models & vector stores ---
+NVIDIA_LLM_MODEL = os.getenv("NVIDIA_LLM_MODEL", "qwen/qwen2.5-7b-instruct")
+PINECONE_INDEX_NAME = os.getenv("PINECONE_INDEX_NAME", "hackathon-pinecone-index")
+
+# Concurrent document downloads per request
+DOWNLOAD_WORKERS = int(os.getenv("DOWNLOAD_WORKERS", "16"))
+# Worker processes for CPU-bound document parsing (0 parses in the calling thread)
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", str(os.cpu_count() or 1)))
+# Chunks per embedding request when building FAISS indexes
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+# SQLite file caching chunk embeddings across runs ("" disables it)
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", "embed_cache.db")
+# Chunking: "recursive" (1000/250 characters, sentence-aware) or "token"
+# (fixed-stride tiktoken windows; faster on very large documents)
+TEXT_SPLITTER = os.getenv("TEXT_SPLITTER", "recursive")
+TOKEN_CHUNK_SIZE = int(os.getenv("TOKEN_CHUNK_SIZE", "256"))
+TOKEN_CHUNK_OVERLAP = int(os.getenv("TOKEN_CHUNK_OVERLAP", "64"))
+# Embedding requests allowed in flight at once across all ingestion threads
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "4"))
+# Stores with at least this many chunks use an IVF + int8 quantized index
+# (IVF training needs roughly 40 vectors per list, so small stores stay exact)
+FAISS_IVF_MIN_VECTORS = int(os.getenv("FAISS_IVF_MIN_VECTORS", "25000"))
+FAISS_NPROBE = int(os.getenv("FAISS_NPROBE", "64"))
+# Optional faiss.index_factory string for those large stores, e.g. "OPQ64,IVF4096_HNSW32,PQ64"
+# for ~64x compression (empty keeps IVF + int8 scalar quantization)
+FAISS_INDEX_FACTORY = os.getenv("FAISS_INDEX_FACTORY", "")
+# Move FAISS indexes to GPU 0 (needs faiss-gpu and a CUDA device); opt-in, since
+# GPU searches are serialized behind one lock and CPU indexes search in parallel
+FAISS_USE_GPU = os.getenv("FAISS_USE_GPU", "0") == "1"
+# Chunks retrieved per question in the Flask UI (fewer chunks = shorter prompts)
+RAG_TOP_K = int(os.getenv("RAG_TOP_K", "3"))
+
+# --- Generation ---
+# Answers are one or two sentences, so cap decode length to bound worst-case latency
+RAG_MAX_TOKENS = int(os.getenv("RAG_MAX_TOKENS", "256"))
+# Only every Nth "processed" line is logged at INFO; the rest go to DEBUG
+RAG_PROCESSED_LOG_EVERY = max(int(os.getenv("RAG_PROCESSED_LOG_EVERY", "100")), 1)
+RAG_PREWARM_EXAMPLES = os.getenv("RAG_PREWARM_EXAMPLES", "0") == "1"
+# Build LLM chains for the known models in the background at startup
+RAG_PREBUILD_CHAINS = os.getenv("RAG_PREBUILD_CHAINS", "1") == "1"
+# Micro-batching of concurrent async LLM calls (1 disables it and calls the LLM directly).
+# While batching is on, /api/v1/stream receives each answer as a single chunk.
+RAG_LLM_BATCH_SIZE = int(os.getenv("RAG_LLM_BATCH_SIZE", "1"))
+RAG_LLM_BATCH_WINDOW_MS = float(os.getenv("RAG_LLM_BATCH_WINDOW_MS", "10"))
+
+# --- Caching ---
+REDIS_URL = os.getenv("REDIS_URL", "")
+# Seconds before a cached answer or retrieval result expires (Redis and in-memory)
+QUERY_CACHE_TTL = int(os.getenv("QUERY_CACHE_TTL", "3600"))
+# Max entries per in-memory cache (least recently used entries are evicted)
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "4096"))
+# Max per-document FAISS shards kept in memory by the API
+FAISS_CACHE_SIZE = int(os.getenv("FAISS_CACHE_SIZE", "32"))
+# A cached document URL is trusted this many seconds, then revalidated with a
+# HEAD request (ETag / Last-Modified) before its shard is reused
+URL_REVALIDATE_SECS = int(os.getenv("URL_REVALIDATE_SECS", "300"))
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "0") == "1"
+SEMANTIC_CACHE_DIR = os.getenv("SEMANTIC_CACHE_DIR", "semantic_cache")
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+# Seconds a persisted semantic-cache answer stays usable (it is not tied to the
+# documents it was answered from, so it must expire like the exact-match cache)
+SEMANTIC_CACHE_TTL = int(os.getenv("SEMANTIC_CACHE_TTL", str(QUERY_CACHE_TTL)))
@@ -1,38 +1,126 @@
 import sqlite3
 from datetime import datetime
 import json
+import atexit
+import queue
+import threading
+import time
+
+from core.logger import logger
 
 DB_NAME = "claim_log.db"
+# Logged rows are written in batches: every LOG_FLUSH_ROWS rows or LOG_FLUSH_SECS seconds
+LOG_FLUSH_ROWS = 50
+LOG_FLUSH_SECS = 1.0
+
+_conn = None
+_conn_lock = threading.Lock()
+_log_queue = queue.Queue()
+_writer = None
+_writer_lock = threading.Lock()
+_STOP = object()  # queued by flush(): the writer writes what it holds and exits
+
+def get_connection():
+    """Return the process-wide connection, opening it in WAL mode on first use."""
+    global _conn
+    with _conn_lock:
+        if _conn is None:
+            _conn = sqlite3.connect(DB_NAME, check_same_thread=False, isolation_level=None)
+            _conn.execute("PRAGMA journal_mode=WAL")
+            _conn.execute("PRAGMA synchronous=NORMAL")
+        return _conn
 
 def setup_database():
     """Create the database and the 'logs' table with the new schema."""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS logs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp DATETIME NOT NULL,
-            document_links TEXT,
-            user_query TEXT NOT NULL,
-            llm_response TEXT,
-            time_taken_sec REAL,
-            model_used TEXT
-        )
-    """)
-    conn.commit()
-    conn.close()
+    conn = get_connection()
+    with _conn_lock:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS logs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp DATETIME NOT NULL,
+                document_links TEXT,
+                user_query TEXT NOT NULL,
+                llm_response TEXT,
+                time_taken_sec REAL,
+                model_used TEXT
+            )
+        """)
+    _start_writer()
+
+def _write_rows(rows):
+    conn = get_connection()
+    with _conn_lock:
+        conn.execute("BEGIN")
+        try:
+            conn.executemany("""
+                INSERT INTO logs (timestamp, document_links, user_query, llm_response, time_taken_sec, model_used)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, rows)
+        except sqlite3.Error:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+def _drain(rows):
+    while len(rows) < LOG_FLUSH_ROWS:
+        try:
+            rows.append(_log_queue.get_nowait())
+        except queue.Empty:
+            break
+    return rows
+
+def _writer_loop():
+    stopping = False
+    while not stopping:
+        row = _log_queue.get()
+        if row is _STOP:
+            return
+        rows = [row]
+        deadline = time.monotonic() + LOG_FLUSH_SECS
+        while len(rows) < LOG_FLUSH_ROWS:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                row = _log_queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if row is _STOP:
+                stopping = True
+                break
+            rows.append(row)
+        try:
+            _write_rows(rows)
+        except sqlite3.Error as e:
+            logger.error(f"❌ Failed to write {len(rows)} log rows: {e}")
+
+def _start_writer():
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = threading.Thread(target=_writer_loop, name="db-log-writer", daemon=True)
+            _writer.start()
+            atexit.register(flush)
+
+def flush():
+    """Stop the writer once it has written every row it holds or has queued,
+    then write anything still left (runs at interpreter exit)."""
+    global _writer
+    with _writer_lock:
+        writer, _writer = _writer, None
+    if writer is not None:
+        _log_queue.put(_STOP)
+        writer.join()
+    while not _log_queue.empty():
+        rows = _drain([])
+        if rows:
+            _write_rows(rows)
 
 def log_request(doc_links, query, response_text, time_taken, model_name):
-    """Log the request details, including document links, to the database."""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
+    """Queue the request details, including document links, for the batched writer."""
     # Convert list of links to a JSON string for storage
     links_json = json.dumps(doc_links) if doc_links else None
-    
-    cursor.execute("""
-        INSERT INTO logs (timestamp, document_links, user_query, llm_response, time_taken_sec, model_used)
-        VALUES (?, ?, ?, ?, ?, ?)
-    """, (
+    _log_queue.put((
         datetime.now(),
         links_json,
         query,
@@ -40,5 +128,4 @@ def log_request(doc_links, query, response_text, time_taken, model_name):
         time_taken,
         model_name
     ))
-    conn.commit()
-    conn.close()
+    _start_writer()
@@ -0,0 +1,123 @@
+# Persistent chunk-embedding cache - skips re-embedding text seen in earlier runs
+
+import hashlib
+import logging
+import sqlite3
+import threading
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from core.config import EMBED_CACHE_PATH
+
+# SQLite caps bound parameters per statement; look keys up in slices of this size
+_LOOKUP_SLICE = 500
+
+
+class EmbeddingCache:
+    """SQLite table of chunk text digest -> float16 vector.
+
+    Keys are BLAKE2b-128 digests of the model name plus the chunk text, so
+    vectors from different embedding models never mix. Vectors are stored as
+    float16 (half the disk of float32) and returned as float32 lists.
+    """
+
+    def __init__(self, path=EMBED_CACHE_PATH):
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS emb (key BLOB PRIMARY KEY, vec BLOB NOT NULL)")
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(model, text):
+        h = hashlib.blake2b(digest_size=16)
+        h.update(model.encode("utf-8"))
+        h.update(b"\0")
+        h.update(text.encode("utf-8"))
+        return h.digest()
+
+    def get_many(self, keys):
+        found = {}
+        with self.lock:
+            for start in range(0, len(keys), _LOOKUP_SLICE):
+                part = keys[start:start + _LOOKUP_SLICE]
+                rows = self.conn.execute(
+                    f"SELECT key, vec FROM emb WHERE key IN ({','.join('?' * len(part))})", part
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float16).astype(np.float32).tolist()
+        return found
+
+    def put_many(self, items):
+        rows = [(key, np.asarray(vec, dtype=np.float16).tobytes()) for key, vec in items]
+        with self.lock:
+            self.conn.execute("BEGIN")
+            try:
+                self.conn.executemany("INSERT OR REPLACE INTO emb (key, vec) VALUES (?, ?)", rows)
+                self.conn.execute("COMMIT")
+            except sqlite3.Error:
+                # Never leave the shared connection inside a transaction
+                if self.conn.in_transaction:
+                    self.conn.execute("ROLLBACK")
+                raise
+
+    def embed_documents(self, texts, embed_fn, model):
+        """Vectors for `texts` in order, calling `embed_fn(missing_texts)` only
+        for texts (deduplicated) that are not cached yet."""
+        keys = [self.key(model, t) for t in texts]
+        found = self.get_many(list(set(keys)))
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found:
+                missing.setdefault(key, text)
+        if missing:
+            vectors = embed_fn(list(missing.values()))
+            found.update(zip(missing.keys(), vectors))
+            try:
+                self.put_many(zip(missing.keys(), vectors))
+            except sqlite3.Error as e:
+                # The vectors are still good; they just get recomputed next time
+                logging.getLogger("DocRAG").warning("⚠️ Embedding cache write failed: %s", e)
+        return [found[key] for key in keys]
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache():
+    """Shared EmbeddingCache, or None when EMBED_CACHE_PATH is empty."""
+    global _cache
+    if not EMBED_CACHE_PATH:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = EmbeddingCache()
+        return _cache
+
+
+def model_name(embeddings):
+    """Model id of an embeddings object, looking through wrappers' `base`."""
+    while not getattr(embeddings, "model", None) and hasattr(embeddings, "base"):
+        embeddings = embeddings.base
+    return getattr(embeddings, "model", None) or type(embeddings).__name__
+
+
+class DiskCachedEmbeddings(Embeddings):
+    """Embeddings wrapper whose embed_documents goes through the shared cache."""
+
+    def __init__(self, base):
+        self.base = base
+
+    def embed_documents(self, texts):
+        cache = get_embedding_cache()
+        if cache is None:
+            return self.base.embed_documents(texts)
+        return cache.embed_documents(texts, self.base.embed_documents, model_name(self.base))
+
+    def embed_query(self, text):
+        return self.base.embed_query(text)
+
+    async def aembed_query(self, text):
+        return await self.base.aembed_query(text)
@@ -4,13 +4,60 @@ import os
 import logging
 import sys
 from datetime import datetime
-from logging.handlers import RotatingFileHandler
-import threading
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
+import atexit
+import itertools
+import queue
+import time
+from collections import deque
 
 # --- Logging Configuration ---
 LOG_DIR = "logs"
 os.makedirs(LOG_DIR, exist_ok=True)
 
+# No formatter prints thread or process info, so skip collecting it per record
+logging.logThreads = False
+logging.logProcesses = False
+logging.logMultiprocessing = False
+
+class AtomicCounter:
+    """Lock-free counter. itertools.count.__next__ is a single C call, so it is
+    atomic under the GIL; reads advance both counts, so their difference stays
+    equal to the number of increments."""
+
+    def __init__(self):
+        self._increments = itertools.count()
+        self._reads = itertools.count()
+
+    def increment(self, n=1):
+        for _ in range(n):
+            next(self._increments)
+
+    @property
+    def value(self):
+        return next(self._increments) - next(self._reads)
+
+class CachedTimeFormatter(logging.Formatter):
+    """Formatter that renders asctime once per wall-clock second.
+
+    None of the datefmts show milliseconds, so every record in the same second
+    gets the same string; only the listener thread formats, so the one-entry
+    cache needs no lock.
+    """
+    default_msec_format = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._cached = (None, "")
+
+    def formatTime(self, record, datefmt=None):
+        second = int(record.created)
+        cached_second, text = self._cached
+        if second != cached_second:
+            text = super().formatTime(record, datefmt)
+            self._cached = (second, text)
+        return text
+
 class Logger:
     """
     High-performance logger optimized for DocRAG.
@@ -19,16 +66,32 @@ class Logger:
     
     def __init__(self):
         self.logger = None
-        self.performance_metrics = {
-            "total_requests": 0,
-            "error_count": 0,
-            "warning_count": 0,
-            "cache_hits": 0,
-            "avg_response_time": 0.0,
-            "session_start": datetime.now()
-        }
-        self.lock = threading.Lock()
+        # Counters and the response-time window are updated without locks
+        self.total_requests = AtomicCounter()
+        self.error_count = AtomicCounter()
+        self.warning_count = AtomicCounter()
+        self.cache_hits = AtomicCounter()
+        self.response_times = deque(maxlen=1024)  # most recent request durations
+        self.session_start = datetime.now()
+        self._start_mono = time.monotonic()  # uptime is measured on the monotonic clock
         self._setup_logger()
+
+    @property
+    def performance_metrics(self):
+        """Snapshot of the counters; avg_response_time covers the recent window."""
+        times = list(self.response_times)
+        return {
+            "total_requests": self.total_requests.value,
+            "error_count": self.error_count.value,
+            "warning_count": self.warning_count.value,
+            "cache_hits": self.cache_hits.value,
+            "avg_response_time": sum(times) / len(times) if times else 0.0,
+            "session_start": self.session_start
+        }
+
+    @property
+    def uptime_seconds(self):
+        return time.monotonic() - self._start_mono
     
     def _setup_logger(self):
         """Setup multi-level logging with performance optimization"""
@@ -60,7 +123,7 @@ class Logger:
             encoding='utf-8'
         )
         main_handler.setLevel(logging.DEBUG)
-        main_formatter = logging.Formatter(
+        main_formatter = CachedTimeFormatter(
             '%(asctime)s | %(levelname)-8s | %(module)-15s | %(funcName)-20s | %(message)s',
             datefmt='%H:%M:%S'
         )
@@ -74,7 +137,7 @@ class Logger:
             encoding='utf-8'
         )
         error_handler.setLevel(logging.ERROR)
-        error_formatter = logging.Formatter(
+        error_formatter = CachedTimeFormatter(
             '%(asctime)s | 🚨 ERROR | %(module)s.%(funcName)s:%(lineno)d | %(message)s',
             datefmt='%Y-%m-%d %H:%M:%S'
         )
@@ -88,13 +151,7 @@ class Logger:
             encoding='utf-8'
         )
         metrics_handler.setLevel(logging.INFO)
-        
-        class MetricsFilter(logging.Filter):
-            def filter(self, record):
-                return hasattr(record, 'metric_type')
-        
-        metrics_handler.addFilter(MetricsFilter())
-        metrics_formatter = logging.Formatter(
+        metrics_formatter = CachedTimeFormatter(
             '%(asctime)s | METRIC | %(message)s',
             datefmt='%H:%M:%S'
         )
@@ -103,16 +160,22 @@ class Logger:
         # --- CONSOLE HANDLER ---
         console_handler = logging.StreamHandler(sys.stdout)
         console_handler.setLevel(logging.INFO)
-        console_formatter = logging.Formatter(
+        console_formatter = CachedTimeFormatter(
             ' %(levelname)-8s | %(message)s'
         )
         console_handler.setFormatter(console_formatter)
         
-        # Add all handlers
-        self.logger.addHandler(main_handler)
-        self.logger.addHandler(error_handler)
-        self.logger.addHandler(metrics_handler)
-        self.logger.addHandler(console_handler)
+        # Request threads only enqueue records; a listener thread per logger
+        # formats them and does the file/console I/O
+        self.logger.addHandler(self._start_listener(main_handler, error_handler, console_handler))
+
+        # Metrics go to their own non-propagating logger, so metric lines reach only
+        # the metrics file and ordinary lines never pass through a metrics filter
+        self.metrics_logger = logging.getLogger("DocRAG.metrics")
+        self.metrics_logger.setLevel(logging.INFO)
+        self.metrics_logger.propagate = False
+        self.metrics_logger.handlers.clear()
+        self.metrics_logger.addHandler(self._start_listener(metrics_handler))
         
         # Log session start
         self.logger.info("=" * 80)
@@ -122,25 +185,27 @@ class Logger:
         self.logger.info(f"📊 Metrics Log: {metrics_log_file}")
         self.logger.info("=" * 80)
     
+    @staticmethod
+    def _start_listener(*handlers):
+        """Start a QueueListener draining to `handlers`; return the QueueHandler to attach."""
+        log_queue = queue.SimpleQueue()
+        listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+        listener.start()
+        # Flush whatever is still queued at interpreter exit
+        atexit.register(listener.stop)
+        return QueueHandler(log_queue)
+    
     def log_request_start(self, request_id, question_count, model_name):
         """Log the start of a request"""
-        with self.lock:
-            self.performance_metrics["total_requests"] += 1
+        self.total_requests.increment()
         
         self.logger.info(f"🔥 REQUEST START | ID: {request_id} | Questions: {question_count} | Model: {model_name}")
     
     def log_request_end(self, request_id, total_time, question_count, cache_hits=0):
         """Log the completion of a request with performance metrics"""
-        with self.lock:
-            # Update performance metrics
-            current_avg = self.performance_metrics["avg_response_time"]
-            total_requests = self.performance_metrics["total_requests"]
-            
-            # Calculate new average
-            self.performance_metrics["avg_response_time"] = (
-                (current_avg * (total_requests - 1) + total_time) / total_requests
-            )
-            self.performance_metrics["cache_hits"] += cache_hits
+        # Update performance metrics; the average is computed lazily on read
+        self.response_times.append(total_time)
+        self.cache_hits.increment(cache_hits)
         
         avg_per_question = total_time / question_count if question_count > 0 else 0
         
@@ -148,21 +213,14 @@ class Logger:
         self.logger.info(f"✅ REQUEST END | ID: {request_id} | Total: {total_time:.2f}s | Avg/Q: {avg_per_question:.2f}s | Cache: {cache_hits}")
         
         # Log performance metric
-        metric_record = logging.LogRecord(
-            name=self.logger.name,
-            level=logging.INFO,
-            pathname="",
-            lineno=0,
-            msg=f"RESPONSE_TIME:{total_time:.3f},AVG_PER_QUESTION:{avg_per_question:.3f},CACHE_HITS:{cache_hits},TOTAL_QUESTIONS:{question_count}",
-            args=(),
-            exc_info=None
+        self.metrics_logger.info(
+            "RESPONSE_TIME:%.3f,AVG_PER_QUESTION:%.3f,CACHE_HITS:%d,TOTAL_QUESTIONS:%d",
+            total_time, avg_per_question, cache_hits, question_count
         )
-        metric_record.metric_type = "performance"
-        self.logger.handle(metric_record)
     
     def log_cache_hit(self, question_preview):
         """Log cache hit for performance tracking"""
-        self.logger.debug(f"💾 CACHE HIT: {question_preview}")
+        self.logger.debug("💾 CACHE HIT: %s", question_preview)
     
     def log_model_response(self, question_preview, response_time, complexity="medium"):
         """Log individual model response"""
@@ -170,8 +228,7 @@ class Logger:
     
     def log_error_with_context(self, error_msg, context=None):
         """Log error with additional context for debugging"""
-        with self.lock:
-            self.performance_metrics["error_count"] += 1
+        self.error_count.increment()
         
         error_details = f"❌ {error_msg}"
         if context:
@@ -181,8 +238,7 @@ class Logger:
     
     def log_warning_with_context(self, warning_msg, context=None):
         """Log warning with context"""
-        with self.lock:
-            self.performance_metrics["warning_count"] += 1
+        self.warning_count.increment()
         
         warning_details = f"⚠️ {warning_msg}"
         if context:
@@ -192,9 +248,8 @@ class Logger:
     
     def log_competition_metrics(self):
         """Log current competition performance metrics"""
-        with self.lock:
-            metrics = self.performance_metrics.copy()
-            uptime = (datetime.now() - metrics["session_start"]).total_seconds() / 60
+        metrics = self.performance_metrics
+        uptime = self.uptime_seconds / 60
         
         metrics_summary = (
             f"📊 METRICS | "
@@ -208,56 +263,48 @@ class Logger:
         self.logger.info(metrics_summary)
         
         # Log detailed metrics
-        metric_record = logging.LogRecord(
-            name=self.logger.name,
-            level=logging.INFO,
-            pathname="",
-            lineno=0,
-            msg=f"TOTAL_REQUESTS:{metrics['total_requests']},AVG_RESPONSE_TIME:{metrics['avg_response_time']:.3f},CACHE_HITS:{metrics['cache_hits']},ERROR_COUNT:{metrics['error_count']},WARNING_COUNT:{metrics['warning_count']},UPTIME_MINUTES:{uptime:.1f}",
-            args=(),
-            exc_info=None
+        self.metrics_logger.info(
+            "TOTAL_REQUESTS:%d,AVG_RESPONSE_TIME:%.3f,CACHE_HITS:%d,ERROR_COUNT:%d,WARNING_COUNT:%d,UPTIME_MINUTES:%.1f",
+            metrics['total_requests'], metrics['avg_response_time'], metrics['cache_hits'],
+            metrics['error_count'], metrics['warning_count'], uptime
         )
-        metric_record.metric_type = "summary"
-        self.logger.handle(metric_record)
         
         return metrics
     
     def get_performance_summary(self):
         """Get current performance metrics for API endpoints"""
-        with self.lock:
-            metrics = self.performance_metrics.copy()
-            uptime = (datetime.now() - metrics["session_start"]).total_seconds()
-            
-            return {
-                "total_requests": metrics["total_requests"],
-                "avg_response_time": round(metrics["avg_response_time"], 3),
-                "cache_hits": metrics["cache_hits"],
-                "error_count": metrics["error_count"],
-                "warning_count": metrics["warning_count"],
-                "uptime_seconds": round(uptime, 1),
-                "requests_per_minute": round(metrics["total_requests"] / max(uptime / 60, 1), 2),
-                "cache_hit_rate": round(metrics["cache_hits"] / max(metrics["total_requests"], 1), 3) if metrics["total_requests"] > 0 else 0.0
-            }
+        metrics = self.performance_metrics
+        uptime = self.uptime_seconds
+        
+        return {
+            "total_requests": metrics["total_requests"],
+            "avg_response_time": round(metrics["avg_response_time"], 3),
+            "cache_hits": metrics["cache_hits"],
+            "error_count": metrics["error_count"],
+            "warning_count": metrics["warning_count"],
+            "uptime_seconds": round(uptime, 1),
+            "requests_per_minute": round(metrics["total_requests"] / max(uptime / 60, 1), 2),
+            "cache_hit_rate": round(metrics["cache_hits"] / max(metrics["total_requests"], 1), 3) if metrics["total_requests"] > 0 else 0.0
+        }
     
     # Convenience methods for backward compatibility
-    def info(self, msg):
-        self.logger.info(msg)
+    # Extra positional args are %-formatted lazily, only if a handler emits the record
+    def info(self, msg, *args):
+        self.logger.info(msg, *args)
     
-    def debug(self, msg):
-        self.logger.debug(msg)
+    def debug(self, msg, *args):
+        self.logger.debug(msg, *args)
     
-    def warning(self, msg):
-        with self.lock:
-            self.performance_metrics["warning_count"] += 1
-        self.logger.warning(f"⚠️ {msg}")
+    def warning(self, msg, *args):
+        self.warning_count.increment()
+        self.logger.warning(f"⚠️ {msg}", *args)
     
-    def error(self, msg, exc_info=False):
-        with self.lock:
-            self.performance_metrics["error_count"] += 1
-        self.logger.error(f"❌ {msg}", exc_info=exc_info)
+    def error(self, msg, *args, exc_info=False):
+        self.error_count.increment()
+        self.logger.error(f"❌ {msg}", *args, exc_info=exc_info)
     
-    def critical(self, msg):
-        self.logger.critical(f"🔥 CRITICAL: {msg}")
+    def critical(self, msg, *args):
+        self.logger.critical(f"🔥 CRITICAL: {msg}", *args)
 
 # Initialize the logger instance
 logger = Logger()
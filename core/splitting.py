@@ -0,0 +1,19 @@
+# Text chunking shared by the apps and the Pinecone uploader
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter, TokenTextSplitter
+
+from core.config import TEXT_SPLITTER, TOKEN_CHUNK_SIZE, TOKEN_CHUNK_OVERLAP
+
+
+def make_text_splitter(chunk_size=1000, chunk_overlap=250):
+    """The chunker selected by TEXT_SPLITTER.
+
+    "token" slides fixed TOKEN_CHUNK_SIZE windows over tiktoken ids (encoded
+    once per document in Rust), which is much cheaper on multi-MB documents
+    than recursive character splitting; sizes here are then ignored.
+    """
+    if TEXT_SPLITTER == "token":
+        return TokenTextSplitter(
+            encoding_name="cl100k_base", chunk_size=TOKEN_CHUNK_SIZE, chunk_overlap=TOKEN_CHUNK_OVERLAP
+        )
+    return RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
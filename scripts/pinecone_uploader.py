@@ -1,104 +1,358 @@
+import atexit
+import functools
+import hashlib
+import importlib
+import logging
+import multiprocessing
 import os
+import queue
 import re
 import sqlite3
+import sys
 import tempfile
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
 from urllib.parse import urlparse
 
 import requests
-from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from bs4 import BeautifulSoup
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import (
-    Docx2txtLoader,
-    PyPDFLoader,
-    TextLoader,
-    UnstructuredExcelLoader,
-    UnstructuredImageLoader,
-    UnstructuredPowerPointLoader,
-    WebBaseLoader,
-)
+from langchain_core.documents import Document
 from langchain_nvidia import NVIDIAEmbeddings
-from langchain_pinecone import PineconeVectorStore
 from pinecone import Pinecone, ServerlessSpec
 
-# --- Configuration ---
-load_dotenv()
+# Run as a plain file (python scripts/pinecone_uploader.py) only scripts/ is on
+# sys.path; add the repo root so the shared core package resolves
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.config import NVIDIA_API_KEY, PINECONE_INDEX_NAME
+from core.embed_cache import DiskCachedEmbeddings
+from core.splitting import make_text_splitter
+
+try:
+    # RE2 matches with a DFA (no backtracking), noticeably faster on bulk text
+    import re2 as url_regex_engine
+except ImportError:
+    url_regex_engine = re
+
+try:
+    # lxml's C parser is several times faster than the stdlib html.parser
+    import lxml  # noqa: F401
+    HTML_PARSER = "lxml"
+except ImportError:
+    HTML_PARSER = "html.parser"
+
+# --- Progress Output ---
+# Threads only enqueue records; one listener thread writes them to stdout, so
+# progress output never blocks the download and upload pools
+logger = logging.getLogger("DocRAG.uploader")
+logger.setLevel(logging.INFO)
+logger.propagate = False
+_console = logging.StreamHandler(sys.stdout)
+_console.setFormatter(logging.Formatter("%(message)s"))
+_log_queue = queue.SimpleQueue()
+_listener = QueueListener(_log_queue, _console)
+_listener.start()
+atexit.register(_listener.stop)
+logger.addHandler(QueueHandler(_log_queue))
 
 # --- Database and Link Extraction ---
 DB_FILE = "claim_log.db"
 PROCESSED_LINKS_LOG = "utils/processed_links.log"
+# Content digests of uploaded documents, so the same bytes under another URL
+# (or a URL seen again) are not embedded and upserted twice
+PROCESSED_HASHES_LOG = "utils/processed_hashes.log"
 
 # --- Pinecone & NVIDIA ---
+# Index name and NVIDIA key come from core.config, which loads .env
 PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
-NVIDIA_API_KEY = os.getenv("NVIDIA_API_KEY")
-PINECONE_INDEX_NAME = "hackathon-pinecone-index"
 EMBEDDING_MODEL_NAME = "nvidia/nv-embed-v1"
 EMBEDDING_DIMENSION = 4096
+# Pinecone accepts at most ~100 vectors of this size per upsert request
+UPSERT_BATCH_SIZE = 100
+# Threads of the index client's own pool; async upserts from every upload group
+# share it, so this caps the upsert requests in flight across the whole run
+UPSERT_POOL_THREADS = 30
+# Chunks per embedding request; an upload group is embedded in a few large
+# requests rather than the client's default batches of 50
+EMBED_BATCH_SIZE = int(os.getenv("UPLOADER_EMBED_BATCH_SIZE", 256))
+# Worker processes that parse and chunk links in parallel
+LOAD_WORKERS = min(os.cpu_count() or 1, 8)
+# Processed links are flushed to PROCESSED_LINKS_LOG in batches of this size
+PROCESSED_FLUSH_EVERY = 100
+# Chunks from several links are uploaded together in groups of at least this many
+UPLOAD_GROUP_CHUNKS = 1000
+# Concurrent file downloads; these only wait on the network, so they run in
+# threads and are not tied to the number of parsing processes
+DOWNLOAD_WORKERS = int(os.getenv("UPLOADER_DOWNLOAD_WORKERS", 32))
+# Upload groups whose embedding and upsert run concurrently (both are remote calls)
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", 8))
 
 # --- Document Loaders Map ---
-# Maps file extensions to their corresponding LangChain loader class.
+# Maps file extensions to their corresponding LangChain loader class name.
+# Classes are imported on first use, so a run without images or slides never
+# pulls in the heavy unstructured stack.
 LOADERS = {
-    ".pdf": PyPDFLoader,
-    ".docx": Docx2txtLoader,
-    ".pptx": UnstructuredPowerPointLoader,
-    ".xlsx": UnstructuredExcelLoader,
-    ".xls": UnstructuredExcelLoader,
-    ".png": UnstructuredImageLoader,
-    ".jpg": UnstructuredImageLoader,
-    ".jpeg": UnstructuredImageLoader,
-    ".txt": TextLoader,
-    ".md": TextLoader,
+    ".pdf": "PyPDFLoader",
+    ".docx": "Docx2txtLoader",
+    ".pptx": "UnstructuredPowerPointLoader",
+    ".xlsx": "UnstructuredExcelLoader",
+    ".xls": "UnstructuredExcelLoader",
+    ".png": "UnstructuredImageLoader",
+    ".jpg": "UnstructuredImageLoader",
+    ".jpeg": "UnstructuredImageLoader",
+    ".txt": "TextLoader",
+    ".md": "TextLoader",
+}
+# Images: one document per file, OCR only (skips the layout-detection model)
+LOADER_KWARGS = {
+    "UnstructuredImageLoader": {"mode": "single", "strategy": "ocr_only"},
 }
 
+# One keep-alive session shared by all download threads: links on the same host
+# reuse pooled connections, and transient gateway errors are retried with backoff
+SESSION = requests.Session()
+_adapter = HTTPAdapter(
+    pool_connections=64,
+    pool_maxsize=DOWNLOAD_WORKERS,
+    max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[502, 503, 504]),
+)
+SESSION.mount("https://", _adapter)
+SESSION.mount("http://", _adapter)
+
+URL_PATTERN = url_regex_engine.compile(r'https?://[^\s,"\'\]\[<>]+')
+
 # ==============================================================================
 # Helper Functions
 # ==============================================================================
 
+@functools.lru_cache(maxsize=None)
+def loader_class(name: str):
+    """Import a LangChain document loader class once, on first use."""
+    return getattr(importlib.import_module("langchain_community.document_loaders"), name)
+
+
+@functools.lru_cache(maxsize=None)
+def loader_factory(file_ext: str):
+    """Loader constructor for an extension, with its LOADER_KWARGS bound."""
+    name = LOADERS[file_ext]
+    return functools.partial(loader_class(name), **LOADER_KWARGS.get(name, {}))
+
+
+def get_loader(file_path: str, file_ext: str):
+    return loader_factory(file_ext)(file_path)
+
+
+def url_file_name(link: str):
+    """(file name, lowercased extension) of a URL's path, like Path.name and
+    os.path.splitext but straight off the path string."""
+    file_name = urlparse(link).path.rsplit('/', 1)[-1]
+    dot = file_name.rfind('.')
+    return file_name, file_name[dot:].lower() if dot > 0 else ''
+
+
 def find_all_urls(text_block: str) -> set:
     """Uses a regular expression to find all URLs within a block of text."""
-    url_pattern = r'https?://[^\s,"\'\]\[<>]+'
-    urls = re.findall(url_pattern, text_block)
-    return {url.strip() for url in urls}
+    return {match.group(0).strip() for match in URL_PATTERN.finditer(text_block)}
 
 
 def get_links_from_db() -> set:
     """Connects to the SQLite DB and extracts all unique document links."""
-    print(f"🔍 Accessing database: {DB_FILE}")
+    logger.info(f"🔍 Accessing database: {DB_FILE}")
     if not Path(DB_FILE).exists():
-        print(f"❌ ERROR: Database file not found at '{DB_FILE}'.")
+        logger.error(f"❌ ERROR: Database file not found at '{DB_FILE}'.")
         return set()
 
     all_db_links = set()
     try:
         with sqlite3.connect(DB_FILE) as conn:
-            cursor = conn.cursor()
-            query = "SELECT document_links FROM logs WHERE document_links IS NOT NULL AND document_links != ''"
-            cursor.execute(query)
-            rows = cursor.fetchall()
-            print(f"Found {len(rows)} entries with links.")
-
-            for row in rows:
-                urls_found = find_all_urls(row[0])
-                all_db_links.update(urls_found)
+            # WAL lets this read run alongside the apps' log writes; a large page
+            # cache and mmap cut read syscalls on big log tables
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA cache_size=-65536")
+            conn.execute("PRAGMA mmap_size=268435456")
+            # Partial covering index: the scan below reads only rows that have links
+            # and never touches the (large) response text
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_logs_doc_links ON logs(document_links) "
+                "WHERE document_links IS NOT NULL AND document_links != ''"
+            )
+            # Many questions are asked about the same documents, so most rows repeat;
+            # DISTINCT collapses them inside SQLite, straight off the index
+            query = "SELECT DISTINCT document_links FROM logs WHERE document_links IS NOT NULL AND document_links != ''"
+            link_lists = [item for (item,) in conn.execute(query)]
+            logger.info(f"Found {len(link_lists)} distinct entries with links.")
+
+            # URLs never contain whitespace, so one scan over the newline-joined
+            # rows finds the same links as scanning each row separately
+            all_db_links = find_all_urls("\n".join(link_lists))
     except sqlite3.Error as e:
-        print(f"❌ DATABASE ERROR: Could not read from '{DB_FILE}'. Details: {e}")
+        logger.error(f"❌ DATABASE ERROR: Could not read from '{DB_FILE}'. Details: {e}")
     
     return all_db_links
 
 
-def load_processed_links() -> set:
-    """Loads the set of already processed URLs from the log file."""
-    processed_log = Path(PROCESSED_LINKS_LOG)
+def load_processed_links(path=PROCESSED_LINKS_LOG) -> set:
+    """Loads the set of already processed URLs (or digests) from a log file."""
+    processed_log = Path(path)
     if not processed_log.exists():
         return set()
     with open(processed_log, 'r', encoding='utf-8') as f:
         return {line.strip() for line in f}
 
 
-def mark_link_as_processed(link: str):
-    """Appends a successfully processed URL to the log file."""
-    with open(PROCESSED_LINKS_LOG, 'a', encoding='utf-8') as f:
-        f.write(link + '\n')
+class ProcessedLog:
+    """Append-only log of successfully processed URLs, kept open for a whole run.
+
+    mark() only buffers the line; the buffer is flushed every
+    PROCESSED_FLUSH_EVERY links and fsynced once on close.
+    """
+
+    def __init__(self, path=PROCESSED_LINKS_LOG):
+        self.path = path
+        self._fh = None
+        self._pending = 0
+
+    def __enter__(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._fh = open(self.path, 'a', encoding='utf-8', buffering=1 << 16)
+        return self
+
+    def mark(self, link: str):
+        self._fh.write(link + '\n')
+        self._pending += 1
+        if self._pending >= PROCESSED_FLUSH_EVERY:
+            self.flush()
+
+    def flush(self):
+        self._fh.flush()
+        self._pending = 0
+
+    def __exit__(self, *exc):
+        self.flush()
+        os.fsync(self._fh.fileno())
+        self._fh.close()
+
+
+def download_link(link: str, temp_dir: str):
+    """Downloads a link and returns (source, extension, content digest) (runs in
+    a download thread). The BLAKE2b digest is computed from the blocks as they
+    arrive.
+
+    Files are streamed to disk and `source` is their path, since the loaders
+    open files by name. Web pages are small and parsed by load_web_page from
+    memory, so for them `source` is the page's bytes and nothing touches disk.
+    """
+    file_name, file_ext = url_file_name(link)
+    h = hashlib.blake2b(digest_size=16)
+    with SESSION.get(link, stream=True, timeout=30) as response:
+        response.raise_for_status() # Raise an exception for bad status codes
+        response.raw.decode_content = True
+
+        if file_ext not in LOADERS:
+            content = response.raw.read()
+            h.update(content)
+            return content, ".html", h.hexdigest()
+
+        # Save file temporarily, streamed to disk in 1 MiB blocks; each link gets
+        # its own directory so same-named files from different links never clash
+        temp_file_path = Path(tempfile.mkdtemp(dir=temp_dir)) / file_name
+        with open(temp_file_path, 'wb') as f:
+            for block in iter(lambda: response.raw.read(1 << 20), b""):
+                h.update(block)
+                f.write(block)
+    return temp_file_path, file_ext, h.hexdigest()
+
+
+def load_web_page(link: str, content: bytes) -> list:
+    """Parses a downloaded web page into one Document, with the same text and
+    metadata as WebBaseLoader."""
+    soup = BeautifulSoup(content, HTML_PARSER)
+    metadata = {"source": link}
+    title = soup.find("title")
+    if title:
+        metadata["title"] = title.get_text()
+    description = soup.find("meta", attrs={"name": "description"})
+    if description:
+        metadata["description"] = description.get("content", "No description found.")
+    html = soup.find("html")
+    if html:
+        metadata["language"] = html.get("lang", "No language found.")
+    return [Document(page_content=soup.get_text(), metadata=metadata)]
+
+
+def split_documents(text_splitter, docs) -> list:
+    """text_splitter.split_documents, except that with the character splitter a
+    document already within chunk_size becomes its own single (stripped) chunk
+    without being scanned for separators, which is what splitting would yield."""
+    if not isinstance(text_splitter, RecursiveCharacterTextSplitter) or text_splitter._add_start_index:
+        return text_splitter.split_documents(docs)
+    chunk_size = text_splitter._chunk_size
+    chunks = []
+    for doc in docs:
+        if text_splitter._length_function(doc.page_content) > chunk_size:
+            chunks.extend(text_splitter.split_documents([doc]))
+            continue
+        text = doc.page_content.strip()
+        if text:
+            chunks.append(Document(page_content=text, metadata=dict(doc.metadata)))
+    return chunks
+
+
+def load_link(link: str, source, file_ext: str, text_splitter) -> list:
+    """Parses a downloaded link and returns its chunks (runs in a worker process)."""
+    # A) Handle known file types
+    if file_ext in LOADERS:
+        docs = get_loader(str(source), file_ext).load()
+
+    # B) Handle web pages (default)
+    else:
+        docs = load_web_page(link, source)
+
+    return split_documents(text_splitter, docs) if docs else []
+
+
+def upsert_chunks(index, chunks, embeddings) -> int:
+    """Embeds chunks and upserts them in batches of UPSERT_BATCH_SIZE vectors,
+    all sent with async_req on the index's pool_threads before any is awaited.
+
+    Records use the same layout as PineconeVectorStore (chunk text under the
+    "text" metadata key), so the apps can query them unchanged.
+    """
+    vectors = embeddings.embed_documents([chunk.page_content for chunk in chunks])
+    records = [
+        {"id": str(uuid.uuid4()), "values": vector, "metadata": {**chunk.metadata, "text": chunk.page_content}}
+        for chunk, vector in zip(chunks, vectors)
+    ]
+    batches = [records[i:i + UPSERT_BATCH_SIZE] for i in range(0, len(records), UPSERT_BATCH_SIZE)]
+    pending = [index.upsert(vectors=batch, async_req=True) for batch in batches]
+    for result in pending:
+        result.get()
+    return len(records)
+
+_known_indexes = set()
+
+
+def ensure_index(pinecone):
+    """Creates the Pinecone index if it does not exist. Indexes seen once are
+    remembered, so later calls in the same process skip the list request."""
+    if PINECONE_INDEX_NAME in _known_indexes:
+        return
+    _known_indexes.update(idx["name"] for idx in pinecone.list_indexes())
+    if PINECONE_INDEX_NAME not in _known_indexes:
+        pinecone.create_index(
+            name=PINECONE_INDEX_NAME,
+            dimension=EMBEDDING_DIMENSION,
+            metric="cosine",
+            spec=ServerlessSpec(cloud="aws", region="us-east-1")
+        )
+        _known_indexes.add(PINECONE_INDEX_NAME)
+        logger.info(f"Pinecone index '{PINECONE_INDEX_NAME}' created.")
 
 # ==============================================================================
 # Main Execution
@@ -106,8 +360,8 @@ def mark_link_as_processed(link: str):
 
 def main():
     """Main function to run the data extraction and uploading pipeline."""
-    print("🚀 Starting Intelligent Data Pipeline...")
-    print("=" * 50)
+    logger.info("🚀 Starting Intelligent Data Pipeline...")
+    logger.info("=" * 50)
 
     # --- 1. Get Links and Filter for New Ones ---
     all_db_links = get_links_from_db()
@@ -116,98 +370,140 @@ def main():
     links_to_process = all_db_links - already_processed
 
     if not links_to_process:
-        print("\n✅ No new links to process. Everything is up to date!")
+        logger.info("\n✅ No new links to process. Everything is up to date!")
         return
 
-    print(f"\n✨ Found {len(links_to_process)} new links to process.")
-    print("-" * 50)
+    logger.info(f"\n✨ Found {len(links_to_process)} new links to process.")
+    logger.info("-" * 50)
 
     # --- 2. Initialize Services ---
-    print("🔌 Initializing Pinecone and NVIDIA services...")
+    logger.info("🔌 Initializing Pinecone and NVIDIA services...")
     try:
         # Init Pinecone
         pinecone = Pinecone(api_key=PINECONE_API_KEY)
-        if PINECONE_INDEX_NAME not in [idx["name"] for idx in pinecone.list_indexes()]:
-            pinecone.create_index(
-                name=PINECONE_INDEX_NAME,
-                dimension=EMBEDDING_DIMENSION,
-                metric="cosine",
-                spec=ServerlessSpec(cloud="aws", region="us-east-1")
-            )
-            print(f"Pinecone index '{PINECONE_INDEX_NAME}' created.")
+        ensure_index(pinecone)
         
         # Init Embeddings Model
-        embeddings = NVIDIAEmbeddings(model=EMBEDDING_MODEL_NAME, nvidia_api_key=NVIDIA_API_KEY)
+        # Chunks embedded by earlier runs are read back from the on-disk cache
+        embeddings = DiskCachedEmbeddings(
+            NVIDIAEmbeddings(
+                model=EMBEDDING_MODEL_NAME, nvidia_api_key=NVIDIA_API_KEY, max_batch_size=EMBED_BATCH_SIZE
+            )
+        )
         
-        # Init Text Splitter
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+        index = pinecone.Index(PINECONE_INDEX_NAME, pool_threads=UPSERT_POOL_THREADS)
+
+        # Init Text Splitter (same TEXT_SPLITTER choice as the apps)
+        text_splitter = make_text_splitter(chunk_size=1000, chunk_overlap=200)
 
     except Exception as e:
-        print(f"❌ FATAL: Could not initialize services. Error: {e}")
+        logger.error(f"❌ FATAL: Could not initialize services. Error: {e}")
         return
 
-    print("✅ Services initialized successfully.")
-    print("-" * 50)
+    logger.info("✅ Services initialized successfully.")
+    logger.info("-" * 50)
 
     # --- 3. Process Each New Link ---
+    # Files and web pages are downloaded in DOWNLOAD_WORKERS threads, then
+    # parsed and chunked in LOAD_WORKERS processes. Their chunks are pooled and
+    # uploaded UPLOAD_GROUP_CHUNKS at a time in UPLOAD_WORKERS threads, so small
+    # documents share embedding and upsert round-trips. A link is marked
+    # processed only once the group holding its chunks is uploaded.
+    # Each download's digest is checked here, on the main thread, before it is
+    # parsed: content uploaded by an earlier run is recorded straight away, and
+    # a repeat of content already seen in this run waits for the first link's
+    # upload instead of being parsed and embedded again.
     successful_uploads = 0
-    with tempfile.TemporaryDirectory() as temp_dir:
-        for i, link in enumerate(links_to_process):
-            print(f"\nProcessing link {i+1}/{len(links_to_process)}: {link}")
-            try:
-                docs = None
-                parsed_url = urlparse(link)
-                file_ext = os.path.splitext(parsed_url.path)[1].lower()
-
-                # A) Handle known file types
-                if file_ext in LOADERS:
-                    response = requests.get(link, timeout=30)
-                    response.raise_for_status() # Raise an exception for bad status codes
-
-                    # Save file temporarily
-                    file_name = Path(parsed_url.path).name
-                    temp_file_path = Path(temp_dir) / file_name
-                    with open(temp_file_path, 'wb') as f:
-                        f.write(response.content)
-                    
-                    print(f"  -> Downloaded as file to '{temp_file_path}'")
-                    loader = LOADERS[file_ext](str(temp_file_path))
-                    docs = loader.load()
-                
-                # B) Handle web pages (default)
-                else:
-                    print("  -> Identified as a web page.")
-                    loader = WebBaseLoader(link)
-                    docs = loader.load()
-
-                if not docs:
-                    print("  -> ⚠️ No content could be loaded. Skipping.")
+    duplicates = 0
+    uploaded_digests = load_processed_links(PROCESSED_HASHES_LOG)
+    same_content = {}  # digest first seen this run -> later links with the same bytes
+    # Workers are spawned, not forked: by now this process runs the log listener
+    # and holds the HTTP session, and a fork could copy their held locks
+    spawn = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as temp_dir, \
+            ProcessPoolExecutor(max_workers=LOAD_WORKERS, mp_context=spawn) as pool, \
+            ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as downloaders, \
+            ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) as uploaders, \
+            ProcessedLog() as processed_log, ProcessedLog(PROCESSED_HASHES_LOG) as hashes_log:
+        uploads = {}
+        group_docs, group_chunks = [], []
+
+        def submit_group(docs, chunks):
+            uploads[uploaders.submit(upsert_chunks, index, chunks, embeddings)] = docs
+
+        downloads = {downloaders.submit(download_link, link, temp_dir): link for link in links_to_process}
+        loads = {}
+        pending = set(downloads)
+        loaded = 0
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future in downloads:
+                    link = downloads.pop(future)
+                    try:
+                        source, file_ext, digest = future.result()
+                    except Exception as e:
+                        logger.error(f"\n❌ ERROR downloading {link}: {e}")
+                        continue
+                    if digest in uploaded_digests:
+                        logger.info(f"\n♻️ Same content as an already uploaded document. Skipping {link}")
+                        processed_log.mark(link)
+                        duplicates += 1
+                    elif digest in same_content:
+                        logger.info(f"\n♻️ Same content as another link in this run. Skipping {link}")
+                        same_content[digest].append(link)
+                        duplicates += 1
+                    else:
+                        same_content[digest] = []
+                        load = pool.submit(load_link, link, source, file_ext, text_splitter)
+                        loads[load] = (link, digest)
+                        pending.add(load)
                     continue
 
-                # C) Chunk and Upload
-                chunks = text_splitter.split_documents(docs)
-                print(f"  -> Split into {len(chunks)} chunks.")
-                
-                PineconeVectorStore.from_documents(
-                    documents=chunks,
-                    embedding=embeddings,
-                    index_name=PINECONE_INDEX_NAME
-                )
-
-                # D) Log Success
-                mark_link_as_processed(link)
-                print(f"  -> ✅ Successfully uploaded to Pinecone.")
-                successful_uploads += 1
-
+                link, digest = loads.pop(future)
+                loaded += 1
+                logger.info(f"\nLoaded link {loaded}/{len(links_to_process)}: {link}")
+                try:
+                    chunks = future.result()
+                except Exception as e:
+                    logger.error(f"  -> ❌ ERROR processing link: {e}")
+                    continue
+                if not chunks:
+                    logger.info("  -> ⚠️ No content could be loaded. Skipping.")
+                    continue
+                logger.info(f"  -> Split into {len(chunks)} chunks.")
+
+                group_docs.append((link, digest))
+                group_chunks.extend(chunks)
+                if len(group_chunks) >= UPLOAD_GROUP_CHUNKS:
+                    submit_group(group_docs, group_chunks)
+                    group_docs, group_chunks = [], []
+        if group_chunks:
+            submit_group(group_docs, group_chunks)
+
+        for future in as_completed(uploads):
+            docs = uploads[future]
+            try:
+                uploaded = future.result()
             except Exception as e:
-                print(f"  -> ❌ ERROR processing link: {e}")
+                logger.error(f"❌ ERROR uploading {len(docs)} links: {e}")
+                continue
+            for link, digest in docs:
+                processed_log.mark(link)
+                for duplicate in same_content[digest]:
+                    processed_log.mark(duplicate)
+                uploaded_digests.add(digest)
+                hashes_log.mark(digest)
+            successful_uploads += len(docs)
+            logger.info(f"✅ Uploaded {uploaded} chunks from {len(docs)} links to Pinecone.")
 
     # --- 4. Final Report ---
-    print("\n" + "=" * 50)
-    print("🎉 Pipeline run complete!")
-    print(f"Total new links found: {len(links_to_process)}")
-    print(f"Successfully processed and uploaded: {successful_uploads}")
-    print("=" * 50)
+    logger.info("\n" + "=" * 50)
+    logger.info("🎉 Pipeline run complete!")
+    logger.info(f"Total new links found: {len(links_to_process)}")
+    logger.info(f"Successfully processed and uploaded: {successful_uploads}")
+    logger.info(f"Skipped as duplicate content: {duplicates}")
+    logger.info("=" * 50)
 
 
 if __name__ == "__main__":